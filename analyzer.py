@@ -0,0 +1,277 @@
+import argparse
+import re
+
+from computer import Assembler
+
+MEMORY_SIZE = 256
+BOUND_PATTERN = re.compile(r'@bound\s+(\d+)')  # e.g. "JNZ DELAY ; @bound 255"
+# Opcodes (high nibble) that only read A, so a countdown loop may contain them
+A_PRESERVING = {0x1, 0xA, 0xB, 0xC}
+BLOCK_SIZES = {0xF9: 3, 0xFA: 4, 0xFB: 5, 0xFC: 4}  # FILL, COPY, RECT, BLIT with their operand bytes
+
+class Analysis:
+    def __init__(self):
+        self.wcet = None  # Worst-case instructions from START to HALT, None if unbounded
+        self.max_stack = None  # Deepest stack reached through CALL, None if unbounded
+        self.unbounded_loops = []  # (header address, source line, reason)
+        self.warnings = []
+
+    def report(self):
+        lines = [f"Worst-case instructions: {self.wcet if self.wcet is not None else 'unbounded'}",
+                 f"Maximum stack depth: {self.max_stack if self.max_stack is not None else 'unbounded'}"]
+        for header, source, reason in self.unbounded_loops:
+            lines.append(f"Unbounded loop at {header:02X} ({source}): {reason}")
+        for warning in self.warnings:
+            lines.append(f"Warning: {warning}")
+        return '\n'.join(lines)
+
+class Analyzer:
+    # Walks the assembled image with the same semantics as EightBitComputer.execute
+    def __init__(self, program, line_map=None):
+        self.image = (list(program) + [0] * MEMORY_SIZE)[:MEMORY_SIZE]
+        self.line_map = line_map or []
+        self.result = Analysis()
+        self.functions = {}  # Entry address -> (wcet, stack depth)
+        self.in_progress = set()
+        self.stored = set()  # Addresses written by a reachable STORE, FILL or COPY
+
+    def source(self, pc):
+        return self.line_map[pc] if pc < len(self.line_map) else f"byte {self.image[pc]:02X}" if pc < MEMORY_SIZE else "out of range"
+
+    def decode(self, pc):
+        # Returns (kind, successors); CALL targets are returned by call_target()
+        if pc >= MEMORY_SIZE:
+            return 'halt', []  # fetch() halts with pc_out_of_range
+        byte = self.image[pc]
+        opcode = byte >> 4
+        size = BLOCK_SIZES.get(byte, 2 if opcode in (0x0, 0xA, 0xB, 0xC, 0xD) else 1)
+        if pc + size > MEMORY_SIZE:
+            return 'fault', []  # Operand byte past the end of memory
+        if opcode == 0x0:
+            return 'next', [pc + 2]
+        if opcode == 0xA:
+            return 'jump', [self.jump_target(pc)]
+        if opcode in (0xB, 0xC):
+            return 'branch', [self.jump_target(pc), pc + 2]
+        if opcode == 0xD:
+            return 'call', [pc + 2]
+        if opcode == 0xE:
+            return 'ret', []
+        if byte == 0xF0:
+            return 'halt', []
+        return 'next', [pc + size]
+
+    def jump_target(self, pc):
+        return (pc + 1 + self.image[pc + 1]) % MEMORY_SIZE
+
+    def call_target(self, pc):
+        return (self.image[pc + 1] << 4) | (self.image[pc] & 0x0F)
+
+    def explore(self, entry):
+        nodes = set()
+        stack = [entry]
+        while stack:
+            pc = stack.pop()
+            if pc in nodes:
+                continue
+            nodes.add(pc)
+            stack.extend(self.decode(pc)[1])
+        return nodes
+
+    def analyze(self):
+        self.find_stores(0, set())
+        if any(addr in self.stored for addr in self.explore(0) if addr < MEMORY_SIZE):
+            self.result.warnings.append("program STOREs over its own code; results assume the code is not modified")
+        self.result.wcet, self.result.max_stack = self.function(0, main=True)
+        return self.result
+
+    def find_stores(self, entry, seen):
+        for pc in self.explore(entry):
+            kind, _ = self.decode(pc)
+            if kind == 'fault' or pc >= MEMORY_SIZE:
+                continue
+            byte = self.image[pc]
+            if byte >> 4 == 0x1:
+                self.stored.add(byte & 0x0F)
+            elif byte == 0xF9:  # FILL dst, len
+                dst, length = self.image[pc + 1], self.image[pc + 2]
+                self.stored.update(range(dst, min(dst + length, MEMORY_SIZE)))
+            elif byte == 0xFA:  # COPY src, dst, len
+                dst, length = self.image[pc + 2], self.image[pc + 3]
+                self.stored.update(range(dst, min(dst + length, MEMORY_SIZE)))
+            elif kind == 'call':
+                target = self.call_target(pc)
+                if target not in seen:
+                    seen.add(target)
+                    self.find_stores(target, seen)
+
+    def function(self, entry, main=False):
+        if entry in self.functions:
+            return self.functions[entry]
+        if entry in self.in_progress:
+            self.result.warnings.append(f"recursive CALL to {entry:02X}")
+            return None, None
+        self.in_progress.add(entry)
+        nodes = self.explore(entry)
+        cost = {}
+        depth = 0
+        for pc in nodes:
+            kind, _ = self.decode(pc)
+            cost[pc] = 1
+            if kind == 'call':
+                callee_wcet, callee_stack = self.function(self.call_target(pc))
+                cost[pc] = None if callee_wcet is None else 1 + callee_wcet
+                depth = None if depth is None or callee_stack is None else max(depth, 1 + callee_stack)
+            elif kind == 'ret' and main:
+                self.result.warnings.append(f"RET at {pc:02X} outside a CALL underflows the stack")
+            elif kind == 'fault':
+                self.result.warnings.append(f"instruction at {pc:02X} reads its operand past the end of memory")
+        wcet = self.longest(nodes, entry, lambda pc: self.decode(pc)[1], cost)
+        self.in_progress.discard(entry)
+        self.functions[entry] = (wcet, depth)
+        return wcet, depth
+
+    def longest(self, nodes, entry, succ, cost):
+        # Longest path from entry in instructions, collapsing each loop to
+        # bound * (longest single iteration). None if any loop is unbounded.
+        preds = {pc: [] for pc in nodes}
+        for pc in nodes:
+            for s in succ(pc):
+                if s in nodes:
+                    preds[s].append(pc)
+        components = strongly_connected(nodes, succ)
+        component_of = {pc: i for i, component in enumerate(components) for pc in component}
+        value = {}
+        # Tarjan's algorithm yields components in reverse topological order
+        for i, component in enumerate(components):
+            component_cost = self.component_cost(component, entry, succ, preds, cost)
+            after = 0
+            for pc in component:
+                for s in succ(pc):
+                    if s in nodes and component_of[s] != i:
+                        after = None if after is None or value[component_of[s]] is None else max(after, value[component_of[s]])
+            value[i] = None if component_cost is None or after is None else component_cost + after
+        return value[component_of[entry]]
+
+    def component_cost(self, component, entry, succ, preds, cost):
+        if len(component) == 1:
+            pc = next(iter(component))
+            if pc not in succ(pc):
+                return cost[pc]
+        headers = [pc for pc in component if pc == entry or any(p not in component for p in preds[pc])]
+        if len(headers) != 1:
+            for pc in headers:
+                self.unbounded(pc, "loop has more than one entry")
+            return None
+        header = headers[0]
+        bound = self.loop_bound(component, header, succ, preds)
+        if bound is None:
+            return None
+        iteration = self.longest(component, header, lambda pc: [s for s in succ(pc) if s != header], cost)
+        return None if iteration is None else bound * iteration
+
+    def loop_bound(self, component, header, succ, preds):
+        # A "; @bound N" comment on a jump that stays inside the loop wins over inference
+        annotated = [int(m.group(1)) for pc in component
+                     if pc < MEMORY_SIZE and self.image[pc] >> 4 in (0xA, 0xB, 0xC) and self.jump_target(pc) in component
+                     for m in [BOUND_PATTERN.search(self.source(pc))] if m]
+        if annotated:
+            return max(annotated)
+        bound, reason = self.countdown_bound(component, header, succ, preds)
+        if bound is None:
+            self.unbounded(header, reason)
+        return bound
+
+    def countdown_bound(self, component, header, succ, preds):
+        # Recognizes   LOAD c / header: ... SUB m (or ADD m) ... / JNZ header
+        # where nothing else in the loop changes A and nothing STOREs to m.
+        # Every instruction sets Z from A, so JNZ loops until A reaches zero.
+        chain = [header]
+        while True:
+            nexts = [s for s in succ(chain[-1]) if s in component]
+            if len(nexts) != 1:
+                return None, "loop body branches"
+            if nexts[0] == header:
+                break
+            chain.append(nexts[0])
+        if len(chain) != len(component):
+            return None, "loop body branches"
+        back = chain[-1]
+        if back >= MEMORY_SIZE or self.image[back] >> 4 != 0xC:
+            return None, "no countdown pattern and no @bound annotation"
+        steps = [pc for pc in chain if self.image[pc] >> 4 in (0x2, 0x3)]
+        others = [pc for pc in chain if pc not in steps]
+        if len(steps) != 1 or any(self.image[pc] >> 4 not in A_PRESERVING and not self.preserves_a(pc) for pc in others):
+            return None, "no countdown pattern and no @bound annotation"
+        step = self.image[steps[0]]
+        if step & 0x0F in self.stored:
+            return None, f"countdown step at memory[{step & 0x0F:X}] is written by the program"
+        delta = self.image[step & 0x0F] if step >> 4 == 0x2 else -self.image[step & 0x0F]
+        entries = [p for p in preds[header] if p not in component]
+        if not entries or any(p >= MEMORY_SIZE or self.image[p] >> 4 != 0x0 or p + 2 != header for p in entries):
+            return None, "loop counter is not LOADed just before the loop"
+        bound = 0
+        for p in entries:
+            a = self.image[p + 1] & 0xFF
+            for iterations in range(1, MEMORY_SIZE + 1):
+                a = (a + delta) & 0xFF
+                if a == 0:
+                    break
+            else:
+                return None, f"countdown from {self.image[p + 1]:02X} never reaches zero"
+            bound = max(bound, iterations)
+        return bound, None
+
+    def preserves_a(self, pc):
+        byte = self.image[pc]
+        return byte >> 4 == 0xF and byte not in (0xF0, 0xF1)  # I/O and display, except HALT and IN
+
+    def unbounded(self, header, reason):
+        self.result.unbounded_loops.append((header, self.source(header), reason))
+
+def strongly_connected(nodes, succ):
+    # Tarjan's algorithm; components come out in reverse topological order
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    def visit(v):
+        index[v] = low[v] = len(index)
+        stack.append(v)
+        on_stack.add(v)
+        for w in succ(v):
+            if w not in nodes:
+                continue
+            if w not in index:
+                visit(w)
+                low[v] = min(low[v], low[w])
+            elif w in on_stack:
+                low[v] = min(low[v], index[w])
+        if low[v] == index[v]:
+            component = set()
+            while True:
+                w = stack.pop()
+                on_stack.discard(w)
+                component.add(w)
+                if w == v:
+                    break
+            components.append(component)
+
+    for v in sorted(nodes):
+        if v not in index:
+            visit(v)
+    return components
+
+def analyze_source(code):
+    assembler = Assembler()
+    program = assembler.assemble(code)
+    return Analyzer(program, assembler.line_map).analyze()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static worst-case instruction count and stack depth")
+    parser.add_argument('source', help="Assembly source file")
+    args = parser.parse_args()
+    with open(args.source) as f:
+        print(analyze_source(f.read()).report())
@@ -18,7 +18,9 @@ class EightBitComputer:
         self.interrupt_vector = 0xFE  # Interrupt vector address
         self.interrupt_enabled = True
         self.last_instruction = 0
+        self.last_write = None  # (address, length) of the last memory range written by execute
         self.halted = False
+        self.halt_reason = None  # 'halt', 'pc_out_of_range', 'stack_overflow' or 'stack_underflow'
         self.io_buffer = ""
         self.text_display = [[0 for _ in range(16)] for _ in range(4)]  # 4x16 character display
         self.graphics_display = [[0 for _ in range(32)] for _ in range(32)]  # 32x32 pixel display
@@ -29,6 +31,9 @@ class EightBitComputer:
         self.memory_size = 256 # define memory size
         self.debug = True  # Set to False to disable debug prints
         self.delay = 0 # ability to slow down the computer
+        self.metrics = None  # Optional metrics.Metrics, updated once per run()
+        self.display_updates = 0  # Drained into metrics after each run()
+        self.input_wait = 0.0  # Seconds blocked in input(), drained into metrics
 
     def load_program(self, program):
         for i, instruction in enumerate(program):
@@ -48,6 +53,7 @@ class EightBitComputer:
             return instruction
         else:
             self.halted = True
+            self.halt_reason = 'pc_out_of_range'
             print("Program counter out of memory range. Halting.")
             return 0xF0  # HALT instruction
 
@@ -55,11 +61,13 @@ class EightBitComputer:
         if self.registers['SP'] > 0:
             self.registers['SP'] -= 1
             self.memory[self.registers['SP']] = value
+            self.last_write = (self.registers['SP'], 1)
             if self.debug:
                 print(f"Pushed {value:02X} to stack at SP: {self.registers['SP']:02X}")
         else:
             print("Stack overflow. Halting.")
             self.halted = True
+            self.halt_reason = 'stack_overflow'
 
     def pop(self):
         if self.registers['SP'] < 0xFF:
@@ -71,10 +79,12 @@ class EightBitComputer:
         else:
             print("Stack underflow. Halting.")
             self.halted = True
+            self.halt_reason = 'stack_underflow'
             return 0
 
     def execute(self, instruction):
         self.last_instruction = instruction
+        self.last_write = None
         opcode = instruction >> 4
         operand = instruction & 0x0F
         if self.debug:
@@ -87,6 +97,7 @@ class EightBitComputer:
                 print(f"LOAD: A = {self.registers['A']:02X}")
         elif opcode == 0x1:  # STORE
             self.memory[operand] = self.registers['A']
+            self.last_write = (operand, 1)
             if self.debug:
                 print(f"STORE: memory[{operand:X}] = A = {self.registers['A']:02X}")
         elif opcode == 0x2:  # ADD
@@ -151,11 +162,19 @@ class EightBitComputer:
                 print(f"RET: PC = {self.registers['PC']:02X}")
         elif opcode == 0xF:
             if operand == 0x0:  # HALT
+                if not self.halted:  # fetch() may already have halted with its own reason
+                    self.halt_reason = 'halt'
                 self.halted = True
                 if self.debug:
                     print("HALT: Stopping execution")
             elif operand == 0x1:  # IN
-                self.registers['A'] = ord(input("Input: ")[0])
+                if self.io_buffer:  # Input queued by a host (e.g. the server)
+                    char, self.io_buffer = self.io_buffer[0], self.io_buffer[1:]
+                else:
+                    start = time.time()
+                    char = input("Input: ")[0]
+                    self.input_wait += time.time() - start
+                self.registers['A'] = ord(char)
                 if self.debug:
                     print(f"IN: A = {self.registers['A']:02X}")
             elif operand == 0x2:  # OUT
@@ -189,15 +208,80 @@ class EightBitComputer:
                 self.scroll_display(self.registers['A'])
                 if self.debug:
                     print(f"SCROLL: Scrolled display by {self.registers['A']} lines")
+            elif operand == 0x9:  # FILL dst, len
+                dst, length = self.fetch_operands(2)
+                self.fill_memory(dst, length, self.registers['A'])
+                if self.debug:
+                    print(f"FILL: memory[{dst:02X}:{dst + length:02X}] = A = {self.registers['A']:02X}")
+            elif operand == 0xA:  # COPY src, dst, len
+                src, dst, length = self.fetch_operands(3)
+                self.copy_memory(src, dst, length)
+                if self.debug:
+                    print(f"COPY: memory[{dst:02X}:{dst + length:02X}] = memory[{src:02X}:{src + length:02X}]")
+            elif operand == 0xB:  # RECT x, y, w, h
+                x, y, width, height = self.fetch_operands(4)
+                self.fill_rect(x, y, width, height, 1 if self.registers['A'] else 0)
+                if self.debug:
+                    print(f"RECT: Set {width}x{height} pixels at ({x}, {y}) to {1 if self.registers['A'] else 0}")
+            elif operand == 0xC:  # BLIT src, x, y
+                src, x, y = self.fetch_operands(3)
+                self.blit(src, x, y)
+                if self.debug:
+                    print(f"BLIT: Drew bitmap at memory[{src:02X}] at ({x}, {y})")
 
         self.update_flags(self.registers['A'])
 
+    def fetch_operands(self, count):
+        # Operand bytes following a block instruction, like LOAD's immediate
+        operands = [self.memory[self.registers['PC'] + i] for i in range(count)]
+        self.registers['PC'] += count
+        return operands
+
+    def fill_memory(self, dst, length, value):
+        end = min(dst + length, self.memory_size)
+        if end > dst:
+            self.memory[dst:end] = [value] * (end - dst)
+            self.last_write = (dst, end - dst)
+
+    def copy_memory(self, src, dst, length):
+        # Overlapping ranges behave like memmove: the source slice is read first
+        length = min(length, self.memory_size - src, self.memory_size - dst)
+        if length > 0:
+            self.memory[dst:dst + length] = self.memory[src:src + length]
+            self.last_write = (dst, length)
+
+    def fill_rect(self, x, y, width, height, value):
+        self.display_updates += 1
+        x_end = min(x + width, 32)
+        if x >= x_end:
+            return
+        for row in self.graphics_display[y:min(y + height, 32)]:
+            row[x:x_end] = [value] * (x_end - x)
+
+    def blit(self, src, x, y):
+        # Bitmap in memory: width, height, then one row per line, 8 pixels per byte, MSB first
+        self.display_updates += 1
+        if src + 1 >= self.memory_size:
+            return  # Header runs past the end of memory
+        width, height = self.memory[src], self.memory[src + 1]
+        row_bytes = (width + 7) // 8
+        x_end = min(x + width, 32)
+        if x >= x_end:
+            return
+        for j in range(min(height, 32 - y)):
+            start = src + 2 + j * row_bytes
+            bits = self.memory[start:start + row_bytes]
+            if len(bits) < row_bytes:
+                break  # Bitmap runs past the end of memory
+            self.graphics_display[y + j][x:x_end] = [(bits[i >> 3] >> (7 - (i & 7))) & 1 for i in range(x_end - x)]
+
     def update_flags(self, value):
         self.flags['Z'] = 1 if value == 0 else 0
         self.flags['N'] = 1 if value & 0x80 else 0
         self.registers['A'] = value & 0xFF
 
     def display_char(self, char):
+        self.display_updates += 1
         if self.display_mode == 'text':
             self.text_display[self.cursor_y][self.cursor_x] = char
             self.cursor_x += 1
@@ -206,6 +290,7 @@ class EightBitComputer:
                 self.cursor_y = (self.cursor_y + 1) % 4
 
     def clear_display(self):
+        self.display_updates += 1
         if self.display_mode == 'text':
             self.text_display = [[0 for _ in range(16)] for _ in range(4)]
         else:
@@ -214,14 +299,22 @@ class EightBitComputer:
         self.cursor_y = 0
 
     def set_pixel(self, x, y, value):
+        self.display_updates += 1
         if 0 <= x < 32 and 0 <= y < 32:
             self.graphics_display[y][x] = value
-            print(f"Set pixel at ({x}, {y}) to {value}")
+            if self.debug:
+                print(f"Set pixel at ({x}, {y}) to {value}")
 
     def scroll_display(self, lines):
+        self.display_updates += 1
         if self.display_mode == 'text':
             self.scroll_offset = (self.scroll_offset + lines) % 4
 
+    def waiting_for_input(self):
+        # True when the next instruction is IN and no input is queued
+        pc = self.registers['PC']
+        return pc < self.memory_size and self.memory[pc] == 0xF1 and not self.io_buffer
+
     def handle_interrupt(self):
         if self.interrupt_enabled:
             self.push(self.registers['PC'] & 0xFF)
@@ -231,7 +324,9 @@ class EightBitComputer:
 
     def run(self):
         self.halted = False
+        self.halt_reason = None
         instruction_count = 0
+        start = time.time()
         while not self.halted:
             instruction = self.fetch()
             self.execute(instruction)
@@ -241,6 +336,8 @@ class EightBitComputer:
             #if instruction_count > 248000: # 248k max instructions
             print("Execution limit reached. Halting.")
                 #break
+        if self.metrics:
+            self.metrics.record_batch(self, instruction_count, time.time() - start)
         print(f"Program halted after executing {instruction_count} instructions.")
 
 class Assembler:
@@ -252,15 +349,20 @@ class Assembler:
             'JNZ': 0xC, 'CALL': 0xD, 'RET': 0xE,
             'HALT': 0xF0, 'IN': 0xF1, 'OUT': 0xF2, 'DISP': 0xF3,
             'CURS': 0xF4, 'CLR': 0xF5, 'GMODE': 0xF6, 'GPIX': 0xF7,
-            'SCROLL': 0xF8
+            'SCROLL': 0xF8, 'FILL': 0xF9, 'COPY': 0xFA, 'RECT': 0xFB,
+            'BLIT': 0xFC
         }
+        self.block_operands = {0xF9: 2, 0xFA: 3, 0xFB: 4, 0xFC: 3}  # FILL, COPY, RECT, BLIT
         self.labels = {}
         self.macros = {}
+        self.line_map = []  # Source line (with comment) of each byte from the last assemble()
 
     def assemble(self, code):
         # First pass: collect labels and macros
         lines = code.split('\n')
         program = []
+        sources = []
+        address = 0  # Byte address of the next instruction, so labels can point at DB data
         i = 0
         while i < len(lines):
             line = re.split(r';', lines[i])[0].strip()
@@ -268,46 +370,89 @@ class Assembler:
                 i += 1
                 continue
             if line.startswith('%macro'):
-                i = self.parse_macro(lines, i)
-            elif ':' in line:
-                label, _ = line.split(':', 1)
-                self.labels[label.strip()] = len(program)
-            else:
+                i = self.parse_macro(lines, i) + 1
+                continue
+            if ':' in line:  # A label, optionally followed by an instruction or DB
+                label, line = line.split(':', 1)
+                self.labels[label.strip()] = address
+                line = line.strip()
+            if line:
                 program.append(line)
+                sources.append(lines[i].strip())
+                address += self.size(re.split(r'[,\s]+', line))
             i += 1
 
         # Second pass: assemble instructions
         assembled_program = []
-        for line in program:
+        line_map = []
+        for line, source in zip(program, sources):
+            start = len(assembled_program)
             parts = re.split(r'[,\s]+', line)
             if parts[0] in self.macros:
                 assembled_program.extend(self.expand_macro(parts))
+                line_map.extend(self.line_map)  # Map expanded bytes to the macro body lines
+            elif parts[0] == 'DB':  # Raw data bytes
+                assembled_program.extend(self.parse_operand(part) & 0xFF for part in parts[1:])
+                line_map.extend([source] * (len(assembled_program) - start))
             else:
                 opcode = self.opcodes[parts[0]]
                 if len(parts) > 1:
-                    if parts[1] in self.labels:
-                        operand = self.labels[parts[1]]
-                    else:
-                        operand = int(parts[1], 16) if parts[1].startswith('0x') else int(parts[1])
-                    if opcode in [0xA, 0xB, 0xC]:  # Jump instructions (now relative)
+                    operands = [self.parse_operand(part) for part in parts[1:]]
+                    operand = operands[0]
+                    if opcode in self.block_operands:  # Block instructions take byte operands
+                        assembled_program.append(opcode)
+                        assembled_program.extend(o & 0xFF for o in operands)
+                    elif opcode in [0xA, 0xB, 0xC]:  # Jump instructions (now relative)
                         assembled_program.append(opcode << 4)
-                        # Calculate relative jump
-                        jump_target = operand - (len(assembled_program) + 1)
+                        # Calculate relative jump; execute adds the offset to the address of the offset byte
+                        jump_target = operand - len(assembled_program)
                         assembled_program.append(jump_target & 0xFF)
                     elif opcode == 0xD:  # CALL instruction (still absolute)
-                        assembled_program.append(opcode << 4 | (operand >> 8))
-                        assembled_program.append(operand & 0xFF)
+                        # execute jumps to (second byte << 4) | low nibble of the opcode
+                        assembled_program.append(opcode << 4 | (operand & 0x0F))
+                        assembled_program.append((operand >> 4) & 0xFF)
                     elif opcode == 0x0:  # LOAD
                         assembled_program.append(opcode << 4)
                         assembled_program.append(operand)
                     else:
                         assembled_program.append((opcode << 4) | (operand & 0x0F))
                 else:
-                    assembled_program.append(opcode)
+                    # RET, NOT, SHL and SHR carry their opcode in the high nibble like the rest
+                    assembled_program.append(opcode << 4 if opcode < 0x10 else opcode)
+                line_map.extend([source] * (len(assembled_program) - start))
 
+        self.line_map = line_map
         return assembled_program
 
 
+    def size(self, parts):
+        # Bytes the second pass emits for one line, without resolving any labels.
+        # Every line goes through here in the first pass, so it also checks block operand counts.
+        if parts[0] in self.macros:
+            total = 0
+            for line in self.macro_lines(parts):
+                line = re.split(r';', line)[0].strip()
+                if ':' in line:  # Same as the first pass: a label, optionally followed by an instruction
+                    line = line.split(':', 1)[1].strip()
+                if line:
+                    total += self.size(re.split(r'[,\s]+', line))
+            return total
+        if parts[0] == 'DB':
+            return len(parts) - 1
+        opcode = self.opcodes[parts[0]]
+        if opcode in self.block_operands:
+            if len(parts) - 1 != self.block_operands[opcode]:
+                raise ValueError(f"{parts[0]} takes {self.block_operands[opcode]} operands, got {len(parts) - 1}")
+            return len(parts)
+        if len(parts) == 1:
+            return 1
+        return 2 if opcode in [0x0, 0xA, 0xB, 0xC, 0xD] else 1
+
+    def parse_operand(self, part):
+        if part in self.labels:
+            return self.labels[part]
+        return int(part, 16) if part.startswith('0x') else int(part)
+
     def parse_macro(self, lines, start_index):
         macro_def = lines[start_index].split()
         macro_name = macro_def[1]
@@ -320,7 +465,7 @@ class Assembler:
         self.macros[macro_name] = (macro_args, macro_body)
         return i + 1  # Skip the %endmacro line
 
-    def expand_macro(self, macro_call):
+    def macro_lines(self, macro_call):
         macro_name = macro_call[0]
         macro_args, macro_body = self.macros[macro_name]
         arg_values = macro_call[1:]
@@ -329,57 +474,61 @@ class Assembler:
             for arg, value in zip(macro_args, arg_values):
                 line = line.replace(arg, value)
             expanded.append(line)
-        return self.assemble('\n'.join(expanded))
+        return expanded
+
+    def expand_macro(self, macro_call):
+        return self.assemble('\n'.join(self.macro_lines(macro_call)))
 
 # Example usage
-assembler = Assembler()
-example_program = """
-%macro PRINT_HELLO 0
-    LOAD 0x48 ; 'H'
-    DISP
-    LOAD 0x65 ; 'e'
-    DISP
-    LOAD 0x6C ; 'l'
-    DISP
-    LOAD 0x6C ; 'l'
-    DISP
-    LOAD 0x6F ; 'o'
-    DISP
-%endmacro
-
-START:
-    CLR
-    PRINT_HELLO
-    JMP GRAPHICS
-
-GRAPHICS:
-    LOAD 0x01
-    GMODE
-    LOAD 0x00 ; Set pixel at (0,0)
-    GPIX
-    LOAD 0x1F ; Set pixel at (31,0)
-    GPIX
-    LOAD 0x3E0 ; Set pixel at (0,31)
-    GPIX
-    LOAD 0x3FF ; Set pixel at (31,31)
-    GPIX
-    HALT
-"""
-
-program = assembler.assemble(example_program)
-computer = EightBitComputer()
-computer.load_program(program)
-computer.run()
-
-# After running, you can inspect the computer's state
-print("Final register states:")
-for reg, value in computer.registers.items():
-    print(f"{reg}: {value:02X}")
-
-print("\nFinal display state:")
-for row in computer.text_display:
-    print(''.join([chr(c) if 32 <= c <= 126 else '.' for c in row]))
-
-print("\nGraphics display state (1 means pixel is set):")
-for row in computer.graphics_display:
-    print(''.join(['1' if pixel else '0' for pixel in row]))
\ No newline at end of file
+if __name__ == "__main__":
+    assembler = Assembler()
+    example_program = """
+    %macro PRINT_HELLO 0
+        LOAD 0x48 ; 'H'
+        DISP
+        LOAD 0x65 ; 'e'
+        DISP
+        LOAD 0x6C ; 'l'
+        DISP
+        LOAD 0x6C ; 'l'
+        DISP
+        LOAD 0x6F ; 'o'
+        DISP
+    %endmacro
+
+    START:
+        CLR
+        PRINT_HELLO
+        JMP GRAPHICS
+
+    GRAPHICS:
+        LOAD 0x01
+        GMODE
+        LOAD 0x00 ; Set pixel at (0,0)
+        GPIX
+        LOAD 0x1F ; Set pixel at (31,0)
+        GPIX
+        LOAD 0x3E0 ; Set pixel at (0,31)
+        GPIX
+        LOAD 0x3FF ; Set pixel at (31,31)
+        GPIX
+        HALT
+    """
+
+    program = assembler.assemble(example_program)
+    computer = EightBitComputer()
+    computer.load_program(program)
+    computer.run()
+
+    # After running, you can inspect the computer's state
+    print("Final register states:")
+    for reg, value in computer.registers.items():
+        print(f"{reg}: {value:02X}")
+
+    print("\nFinal display state:")
+    for row in computer.text_display:
+        print(''.join([chr(c) if 32 <= c <= 126 else '.' for c in row]))
+
+    print("\nGraphics display state (1 means pixel is set):")
+    for row in computer.graphics_display:
+        print(''.join(['1' if pixel else '0' for pixel in row]))
\ No newline at end of file
@@ -10,8 +10,10 @@ from computer import Assembler
 from program import program
 
 class VisualEmulator:
-    def __init__(self, computer):
+    def __init__(self, computer, metrics=None):
         self.computer = computer
+        self.metrics = metrics  # Optional metrics.Metrics, updated by the computer's run()
+        self.computer.metrics = metrics
         self.root = tk.Tk()
         self.root.title("8-bit Computer Emulator")
         self.root.geometry("800x950")  # Increased height for status display
@@ -144,6 +146,7 @@ class VisualEmulator:
 
     def reset(self):
         self.computer.__init__()
+        self.computer.metrics = self.metrics
         self.computer.load_program(program)  # Reload the program
         self.update_display()
 
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from computer import EightBitComputer
+from computer import Assembler
+
+EDGE_MAP_SIZE = 1 << 16  # One byte per (previous PC, PC) pair
+FAULTS = ('stack_overflow', 'stack_underflow', 'pc_out_of_range', 'operand_out_of_range', 'budget')
+INTERESTING_BYTES = (0x00, 0x01, 0x7F, 0x80, 0xF0, 0xF1, 0xFE, 0xFF)
+
+def quiet_worker():
+    # OUT and the halt messages print straight to stdout; keep workers silent
+    sys.stdout = open(os.devnull, 'w')
+
+def execute_case(image, text, budget):
+    # Run one input on a fresh headless computer.
+    # Returns the set of edges hit, why the run stopped and where: the PC of
+    # the faulting instruction, or for budget exhaustion the source of the last
+    # backward jump, i.e. the loop that never ended.
+    computer = EightBitComputer()
+    computer.debug = False
+    computer.memory[:len(image)] = image
+    computer.io_buffer = text
+    memory = computer.memory
+    registers = computer.registers
+    fetch = computer.fetch
+    execute = computer.execute
+    edges = set()
+    prev = 0
+    back = 0
+    executed = 0
+    reason = None
+    while not computer.halted:
+        if executed >= budget:
+            reason = 'budget'
+            break
+        pc = registers['PC']
+        if pc >= computer.memory_size:  # fetch() would halt; no edge, so wild jumps add no fake coverage
+            reason = 'pc_out_of_range'
+            break
+        if memory[pc] == 0xF1 and not computer.io_buffer:
+            reason = 'input_exhausted'
+            break
+        edges.add((prev << 8) | pc)
+        if pc <= prev:
+            back = prev
+        prev = pc
+        try:
+            execute(fetch())
+        except IndexError:  # An operand byte past the end of memory
+            reason = 'operand_out_of_range'
+            break
+        executed += 1
+    return edges, reason or computer.halt_reason, back if reason == 'budget' else prev, executed
+
+def run_batch(cases, coverage, budget):
+    # Runs in a worker: keep only cases that reach new edges or fault
+    seen = bytearray(coverage)
+    results = []
+    instructions = 0
+    for image, text in cases:
+        edges, reason, pc, executed = execute_case(image, text, budget)
+        instructions += executed
+        new = [e for e in edges if not seen[e]]
+        for e in new:
+            seen[e] = 1
+        if new or reason in FAULTS:
+            results.append((image, text, reason, pc, new))
+    return len(cases), instructions, results
+
+class Fuzzer:
+    def __init__(self, program, inputs=('',), budget=2000, workers=None, batch_size=250,
+                 mutate_image=True, seed=None):
+        image = bytes(b & 0xFF for b in program[:256])
+        self.corpus = [(image, text) for text in inputs]
+        self.budget = budget
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.mutate_image = mutate_image
+        self.random = random.Random(seed)
+        self.coverage = bytearray(EDGE_MAP_SIZE)
+        self.faults = {}  # (reason, faulting PC) -> first (image, text) that triggered it
+        self.executions = 0
+        self.instructions = 0
+
+    def edge_count(self):
+        return EDGE_MAP_SIZE - self.coverage.count(0)
+
+    def mutate(self, case):
+        image, text = case
+        rnd = self.random
+        image = bytearray(image)
+        text = list(text)
+        for _ in range(rnd.randint(1, 4)):
+            choice = rnd.random()
+            if self.mutate_image and image and choice < 0.4:
+                i = rnd.randrange(len(image))
+                if choice < 0.15:
+                    image[i] ^= 1 << rnd.randrange(8)
+                elif choice < 0.3:
+                    image[i] = rnd.choice(INTERESTING_BYTES)
+                else:
+                    image[i] = rnd.randrange(256)
+            elif choice < 0.6 or not text:
+                text.insert(rnd.randint(0, len(text)), chr(rnd.randrange(256)))
+            elif choice < 0.75:
+                text[rnd.randrange(len(text))] = chr(rnd.randrange(256))
+            elif choice < 0.9:
+                del text[rnd.randrange(len(text))]
+            else:  # Splice in the input of another corpus entry
+                other = rnd.choice(self.corpus)[1]
+                cut = rnd.randint(0, len(text))
+                text = text[:cut] + list(other[rnd.randint(0, len(other)):])
+        return bytes(image[:256]), ''.join(text)
+
+    def next_batch(self):
+        return [self.mutate(self.random.choice(self.corpus)) for _ in range(self.batch_size)]
+
+    def merge(self, results):
+        for image, text, reason, pc, new in results:
+            fresh = [e for e in new if not self.coverage[e]]
+            for e in fresh:
+                self.coverage[e] = 1
+            if fresh:
+                self.corpus.append((image, text))
+            if reason in FAULTS and (reason, pc) not in self.faults:
+                self.faults[(reason, pc)] = (image, text)
+
+    def run(self, duration=None, max_executions=None, report_every=5.0):
+        start = time.time()
+        last_report = start
+        with ProcessPoolExecutor(self.workers, initializer=quiet_worker) as pool:
+            pending = set()
+            while True:
+                done_time = duration is not None and time.time() - start >= duration
+                done_count = max_executions is not None and self.executions >= max_executions
+                if not done_time and not done_count:
+                    while len(pending) < self.workers * 2:
+                        pending.add(pool.submit(run_batch, self.next_batch(), bytes(self.coverage), self.budget))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    count, instructions, results = future.result()
+                    self.executions += count
+                    self.instructions += instructions
+                    self.merge(results)
+                if time.time() - last_report >= report_every:
+                    last_report = time.time()
+                    self.report(last_report - start)
+        self.report(time.time() - start)
+
+    def report(self, elapsed):
+        rate = self.executions / elapsed if elapsed else 0
+        print(f"{self.executions} execs ({rate * 3600:,.0f}/hour), {self.edge_count()} edges, "
+              f"{len(self.corpus)} corpus, {len(self.faults)} faults")
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for (reason, pc), (image, text) in self.faults.items():
+            with open(os.path.join(directory, f"{reason}-{pc:03X}.json"), 'w') as f:
+                json.dump({'reason': reason, 'pc': pc, 'image': list(image), 'input': text}, f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coverage-guided fuzzing of a guest program's IN input")
+    parser.add_argument('source', help="Assembly source file")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to fuzz")
+    parser.add_argument('--budget', type=int, default=2000, help="Instruction budget per run")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed-input', action='append', default=[], help="Initial input (repeatable)")
+    parser.add_argument('--input-only', action='store_true', help="Mutate only input, not the memory image")
+    parser.add_argument('--out', default='faults', help="Directory to save faulting cases to")
+    args = parser.parse_args()
+
+    with open(args.source) as f:
+        program = Assembler().assemble(f.read())
+    fuzzer = Fuzzer(program, args.seed_input or [''], budget=args.budget, workers=args.workers,
+                    mutate_image=not args.input_only)
+    fuzzer.run(duration=args.duration)
+    fuzzer.save(args.out)
+    print(f"Saved {len(fuzzer.faults)} faulting cases to {args.out}")
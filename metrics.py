@@ -0,0 +1,102 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HALT_REASONS = ('halt', 'pc_out_of_range', 'stack_overflow', 'stack_underflow', 'operand_out_of_range', 'error')
+
+class Metrics:
+    # Counters are updated once per batch of instructions (a run() call or a
+    # server time slice), never per instruction, so they can stay enabled.
+    def __init__(self):
+        self.lock = threading.Lock()  # The HTTP thread reads while the run loop writes
+        self.instructions = 0
+        self.busy_seconds = 0.0
+        self.instructions_per_second = 0.0  # Of the most recent batch
+        self.halts = dict.fromkeys(HALT_REASONS, 0)
+        self.input_wait_seconds = 0.0
+        self.display_updates = 0
+        self.assembler_cache_hits = 0
+        self.assembler_cache_misses = 0
+
+    def record_batch(self, computer, instructions, seconds):
+        # Drains the computer's own counters so each update is only counted once
+        with self.lock:
+            self.instructions += instructions
+            self.busy_seconds += seconds
+            if seconds > 0:
+                self.instructions_per_second = instructions / seconds
+            if instructions and computer.halted and computer.halt_reason:
+                self.halts[computer.halt_reason] = self.halts.get(computer.halt_reason, 0) + 1
+            self.display_updates += computer.display_updates
+            self.input_wait_seconds += computer.input_wait
+        computer.display_updates = 0
+        computer.input_wait = 0.0
+
+    def record_input_wait(self, seconds):
+        with self.lock:
+            self.input_wait_seconds += seconds
+
+    def record_assembly(self, hit):
+        with self.lock:
+            if hit:
+                self.assembler_cache_hits += 1
+            else:
+                self.assembler_cache_misses += 1
+
+    def render(self):
+        # Prometheus text exposition format
+        with self.lock:
+            samples = [
+                ('eightbit_instructions_total', 'counter', "Instructions executed.", [('', self.instructions)]),
+                ('eightbit_busy_seconds_total', 'counter', "Seconds spent executing instructions.",
+                 [('', self.busy_seconds)]),
+                ('eightbit_instructions_per_second', 'gauge', "Execution speed of the most recent batch.",
+                 [('', self.instructions_per_second)]),
+                ('eightbit_halts_total', 'counter', "Machines halted, by reason.",
+                 [(f'{{reason="{reason}"}}', count) for reason, count in self.halts.items()]),
+                ('eightbit_input_wait_seconds_total', 'counter', "Seconds spent waiting for IN input.",
+                 [('', self.input_wait_seconds)]),
+                ('eightbit_display_updates_total', 'counter', "Text and graphics display updates.",
+                 [('', self.display_updates)]),
+                ('eightbit_assembler_cache_hits_total', 'counter', "Assembled programs served from cache.",
+                 [('', self.assembler_cache_hits)]),
+                ('eightbit_assembler_cache_misses_total', 'counter', "Programs assembled from source.",
+                 [('', self.assembler_cache_misses)]),
+            ]
+        lines = []
+        for name, kind, help_text, values in samples:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # Write then rename so a scraper never reads a partial file
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port=9800, host='127.0.0.1'):
+        # Serve /metrics from a background thread; returns the HTTP server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
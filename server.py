@@ -0,0 +1,312 @@
+import argparse
+import asyncio
+import json
+import time
+
+from computer import EightBitComputer
+from computer import Assembler
+from metrics import Metrics
+
+SLICE_INSTRUCTIONS = 1000  # Instructions a session runs before yielding to the others
+SUBSCRIBER_QUEUE = 256  # Display events buffered per subscriber before it is dropped as too slow
+
+class Subscriber:
+    # Events go through a bounded queue drained by its own task, so the
+    # scheduler never waits on a client socket
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE)
+        self.task = asyncio.create_task(self.pump())
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def pump(self):
+        while await send(self.writer, await self.queue.get()):
+            pass
+
+    def close(self):
+        self.task.cancel()
+
+class Session:
+    def __init__(self, session_id, metrics):
+        self.id = session_id
+        self.metrics = metrics
+        self.computer = EightBitComputer()
+        self.computer.debug = False
+        self.program = []
+        self.running = False
+        self.waiting_since = None  # When the session started waiting for IN input
+        self.subscribers = {}  # Writer -> Subscriber
+        self.take_snapshot()
+
+    def load(self, program):
+        self.running = False
+        self.program = program
+        self.reset()
+
+    def reset(self):
+        self.waiting_since = None
+        self.computer.__init__()
+        self.computer.debug = False
+        self.computer.load_program(self.program)
+
+    def start(self):
+        self.running = True
+        if self.waiting_since is None and self.computer.waiting_for_input():
+            self.waiting_since = time.time()
+
+    def runnable(self):
+        return self.running and not self.computer.halted and not self.computer.waiting_for_input()
+
+    def step(self, count):
+        computer = self.computer
+        executed = 0
+        start = time.time()
+        while executed < count and not computer.halted:
+            if computer.waiting_for_input():
+                break
+            try:
+                computer.execute(computer.fetch())
+            except Exception as e:  # A faulting guest only halts its own session
+                computer.halted = True
+                computer.halt_reason = 'operand_out_of_range' if isinstance(e, IndexError) else 'error'
+            executed += 1
+        self.metrics.record_batch(computer, executed, time.time() - start)
+        if self.waiting_since is None and computer.waiting_for_input():
+            self.waiting_since = time.time()
+        if computer.halted:
+            self.running = False
+        return executed
+
+    def feed_input(self, text):
+        if self.waiting_since is not None:
+            self.metrics.record_input_wait(time.time() - self.waiting_since)
+            self.waiting_since = None
+        self.computer.io_buffer += text
+
+    def status(self):
+        if self.computer.halted:
+            return 'halted'
+        if self.computer.waiting_for_input():
+            return 'waiting'
+        return 'running' if self.running else 'stopped'
+
+    def state(self):
+        return {
+            'session': self.id,
+            'status': self.status(),
+            'registers': dict(self.computer.registers),
+            'flags': dict(self.computer.flags),
+            'last_instruction': self.computer.last_instruction,
+            'halt_reason': self.computer.halt_reason,
+            'display_mode': self.computer.display_mode,
+        }
+
+    def take_snapshot(self):
+        self.text_snapshot = [row[:] for row in self.computer.text_display]
+        self.graphics_snapshot = [row[:] for row in self.computer.graphics_display]
+
+    def display_diff(self, full=False):
+        # Changed cells as [y, x, char] and changed pixels as [x, y, value]
+        text = []
+        for y, row in enumerate(self.computer.text_display):
+            old = self.text_snapshot[y]
+            if full or row != old:
+                text.extend([y, x, c] for x, c in enumerate(row) if c != (0 if full else old[x]))
+        pixels = []
+        for y, row in enumerate(self.computer.graphics_display):
+            old = self.graphics_snapshot[y]
+            if full or row != old:
+                pixels.extend([x, y, p] for x, p in enumerate(row) if p != (0 if full else old[x]))
+        return text, pixels
+
+    def subscribe(self, writer):
+        subscriber = self.subscribers.get(writer) or Subscriber(writer)
+        self.subscribers[writer] = subscriber
+        text, pixels = self.display_diff(full=True)
+        subscriber.offer({'event': 'display', 'session': self.id, 'status': self.status(),
+                          'pc': self.computer.registers['PC'], 'full': True, 'text': text, 'pixels': pixels})
+
+    def unsubscribe(self, writer):
+        subscriber = self.subscribers.pop(writer, None)
+        if subscriber:
+            subscriber.close()
+
+    def publish(self):
+        text, pixels = self.display_diff()
+        self.take_snapshot()
+        if not self.subscribers:
+            return
+        message = {'event': 'display', 'session': self.id, 'status': self.status(),
+                   'pc': self.computer.registers['PC']}
+        if text:
+            message['text'] = text
+        if pixels:
+            message['pixels'] = pixels
+        for writer, subscriber in list(self.subscribers.items()):
+            if subscriber.task.done() or not subscriber.offer(message):
+                self.unsubscribe(writer)  # Gone, or too slow to keep up with the diffs
+
+async def send(writer, message):
+    try:
+        writer.write((json.dumps(message) + '\n').encode())
+        await writer.drain()
+        return True
+    except (ConnectionError, RuntimeError):
+        return False
+
+COMMANDS = ('create', 'list', 'load', 'start', 'stop', 'step', 'reset', 'input', 'subscribe', 'unsubscribe',
+            'state', 'close')
+
+class EmulatorServer:
+    def __init__(self, slice_instructions=SLICE_INSTRUCTIONS, metrics=None):
+        self.slice_instructions = slice_instructions
+        self.metrics = metrics or Metrics()
+        self.assembled = {}  # Source -> program, so re-uploaded sources skip the assembler
+        self.sessions = {}
+        self.next_id = 1
+        self.wake = asyncio.Event()
+
+    async def schedule(self):
+        # Round-robin time slices so no session starves the others
+        while True:
+            runnable = [s for s in self.sessions.values() if s.runnable()]
+            if not runnable:
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+            for session in runnable:
+                if session.id not in self.sessions or not session.runnable():
+                    continue
+                session.step(self.slice_instructions)
+                session.publish()
+                await asyncio.sleep(0)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = await self.dispatch(request, writer)
+                except (ValueError, KeyError, TypeError, IndexError, RecursionError) as e:
+                    response = {'ok': False, 'error': str(e)}
+                if not await send(writer, response):
+                    break
+        finally:
+            for session in self.sessions.values():
+                session.unsubscribe(writer)
+            writer.close()
+
+    async def dispatch(self, request, writer):
+        cmd = request['cmd']
+        if cmd not in COMMANDS:
+            return {'ok': False, 'error': f"Unknown command {cmd}"}
+        if cmd == 'create':
+            session = Session(self.next_id, self.metrics)
+            self.sessions[session.id] = session
+            self.next_id += 1
+            return {'ok': True, 'session': session.id}
+        if cmd == 'list':
+            return {'ok': True, 'sessions': [s.state() for s in self.sessions.values()]}
+
+        session = self.sessions.get(request['session'])
+        if session is None:
+            return {'ok': False, 'error': f"No session {request['session']}"}
+
+        if cmd == 'load':
+            if 'source' in request:
+                program = self.assemble(request['source'])
+            else:
+                program = [b & 0xFF for b in request['image']]
+            session.load(program)
+            session.publish()
+            return {'ok': True, 'session': session.id, 'size': len(program)}
+        elif cmd == 'start':
+            session.start()
+            self.wake.set()
+        elif cmd == 'stop':
+            session.running = False
+        elif cmd == 'step':
+            # Large counts run in slices so other sessions and clients keep going
+            session.running = False
+            count = request.get('count', 1)
+            executed = 0
+            while executed < count and session.id in self.sessions and not session.running:
+                chunk = min(count - executed, self.slice_instructions)
+                done = session.step(chunk)
+                executed += done
+                session.publish()
+                if done < chunk:
+                    break
+                await asyncio.sleep(0)
+            return {'ok': True, 'executed': executed, **session.state()}
+        elif cmd == 'reset':
+            session.running = False
+            session.reset()
+            session.publish()
+        elif cmd == 'input':
+            session.feed_input(request['text'])
+            self.wake.set()
+        elif cmd == 'subscribe':
+            session.subscribe(writer)
+        elif cmd == 'unsubscribe':
+            session.unsubscribe(writer)
+        elif cmd == 'state':
+            pass
+        elif cmd == 'close':
+            for writer in list(session.subscribers):
+                session.unsubscribe(writer)
+            del self.sessions[session.id]
+            return {'ok': True, 'session': session.id}
+        return {'ok': True, **session.state()}
+
+    def assemble(self, source):
+        hit = source in self.assembled
+        if not hit:
+            self.assembled[source] = Assembler().assemble(source)
+        self.metrics.record_assembly(hit)
+        return self.assembled[source]
+
+async def write_metrics(metrics, path, interval):
+    while True:
+        await asyncio.sleep(interval)
+        metrics.write(path)
+
+async def serve(host='127.0.0.1', port=8800, path=None, slice_instructions=SLICE_INSTRUCTIONS,
+                metrics_port=None, metrics_file=None, metrics_interval=10.0):
+    server = EmulatorServer(slice_instructions)
+    tasks = [asyncio.create_task(server.schedule())]
+    if metrics_port:
+        server.metrics.serve(metrics_port)
+    if metrics_file:
+        tasks.append(asyncio.create_task(write_metrics(server.metrics, metrics_file, metrics_interval)))
+    if path:
+        listener = await asyncio.start_unix_server(server.handle_client, path=path)
+    else:
+        listener = await asyncio.start_server(server.handle_client, host, port)
+    print(f"Serving on {', '.join(str(s.getsockname()) for s in listener.sockets)}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve many 8-bit computer sessions over a socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--unix', help="Listen on a Unix socket path instead of TCP")
+    parser.add_argument('--slice', type=int, default=SLICE_INSTRUCTIONS, help="Instructions per time slice")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this HTTP port")
+    parser.add_argument('--metrics-file', help="Periodically write Prometheus metrics to this file")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.unix, args.slice, args.metrics_port, args.metrics_file))
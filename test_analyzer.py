@@ -0,0 +1,125 @@
+from computer import EightBitComputer
+from computer import Assembler
+from analyzer import analyze_source
+
+def run(source):
+    # Instructions executed up to and including HALT, and the deepest stack reached
+    computer = EightBitComputer()
+    computer.debug = False
+    computer.load_program(Assembler().assemble(source))
+    executed = 0
+    depth = 0
+    while not computer.halted:
+        computer.execute(computer.fetch())
+        executed += 1
+        depth = max(depth, 0xFF - computer.registers['SP'])
+    return computer, executed, depth
+
+COUNTDOWN = """
+    JMP START
+ONE: DB 1
+START:
+    LOAD 3
+LOOP:
+    SUB ONE
+    JNZ LOOP
+    HALT
+"""
+
+ANNOTATED = """
+    JMP START
+ONE: DB 1
+START:
+    LOAD 4
+LOOP:
+    DISP
+    SUB ONE
+    JZ DONE
+    JMP LOOP ; @bound 4
+DONE:
+    HALT
+"""
+
+NESTED = """
+    JMP OUTER
+ONE: DB 1
+N: DB 2
+OUTER:
+    LOAD 3
+INNER:
+    SUB ONE
+    JNZ INNER
+    ADD N
+    SUB ONE
+    STORE N
+    JNZ OUTER ; @bound 2
+    HALT
+"""
+
+CALLS = """
+    JMP START
+ONE: DB 1
+START:
+    CALL DELAY
+    CALL DELAY
+    HALT
+DELAY:
+    LOAD 2
+WAIT:
+    SUB ONE
+    JNZ WAIT
+    RET
+"""
+
+RECURSIVE = """
+    CALL F
+    HALT
+F:
+    CALL F
+    RET
+"""
+
+def test_countdown_is_exact():
+    analysis = analyze_source(COUNTDOWN)
+    computer, executed, _ = run(COUNTDOWN)
+    assert computer.halt_reason == 'halt'
+    assert analysis.unbounded_loops == []
+    assert analysis.wcet == executed == 9
+
+def test_annotated_loop_is_an_upper_bound():
+    analysis = analyze_source(ANNOTATED)
+    computer, executed, _ = run(ANNOTATED)
+    assert computer.halt_reason == 'halt'
+    assert analysis.unbounded_loops == []
+    assert executed == 18
+    assert analysis.wcet == 19
+
+def test_readme_annotation():
+    analysis = analyze_source("LOAD 5\nLOOP:\nDISP\nJMP LOOP ; @bound 16\nHALT")
+    assert analysis.unbounded_loops == []
+    assert analysis.wcet == 1 + 16 * 2
+
+def test_unannotated_loop_is_unbounded():
+    analysis = analyze_source("LOAD 5\nLOOP:\nDISP\nJMP LOOP\nHALT")
+    assert analysis.wcet is None
+    assert [(header, source) for header, source, _ in analysis.unbounded_loops] == [(2, 'DISP')]
+
+def test_nested_loops_are_exact():
+    analysis = analyze_source(NESTED)
+    computer, executed, _ = run(NESTED)
+    assert computer.halt_reason == 'halt'
+    assert analysis.unbounded_loops == []
+    assert analysis.wcet == executed == 24
+
+def test_calls_are_exact():
+    analysis = analyze_source(CALLS)
+    computer, executed, depth = run(CALLS)
+    assert computer.halt_reason == 'halt'
+    assert analysis.wcet == executed == 16
+    assert analysis.max_stack == depth == 1
+
+def test_recursion_is_unbounded():
+    analysis = analyze_source(RECURSIVE)
+    assert analysis.wcet is None
+    assert analysis.max_stack is None
+    assert any('recursive CALL' in warning for warning in analysis.warnings)
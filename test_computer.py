@@ -0,0 +1,122 @@
+import pytest
+
+from computer import EightBitComputer
+from computer import Assembler
+
+def run(image, memory=None):
+    computer = EightBitComputer()
+    computer.debug = False
+    computer.memory[:len(image)] = image
+    for address, value in (memory or {}).items():
+        computer.memory[address] = value
+    while not computer.halted:
+        computer.execute(computer.fetch())
+    return computer
+
+def test_fill():
+    computer = run(Assembler().assemble("LOAD 7\nFILL 0x40, 5\nHALT"))
+    assert computer.memory[0x3F:0x46] == [0, 7, 7, 7, 7, 7, 0]
+    assert computer.halt_reason == 'halt'
+
+def test_fill_clipped_at_end_of_memory():
+    computer = EightBitComputer()
+    computer.fill_memory(0xFC, 10, 9)
+    assert computer.memory[0xFB:] == [0, 9, 9, 9, 9]
+    assert computer.last_write == (0xFC, 4)
+
+def test_copy():
+    computer = run([0xFA, 0x40, 0x80, 3, 0xF0], {0x40: 1, 0x41: 2, 0x42: 3})
+    assert computer.memory[0x80:0x84] == [1, 2, 3, 0]
+
+def test_copy_overlap_forward():
+    computer = EightBitComputer()
+    computer.memory[0x40:0x44] = [1, 2, 3, 4]
+    computer.copy_memory(0x40, 0x42, 4)
+    assert computer.memory[0x40:0x46] == [1, 2, 1, 2, 3, 4]
+    assert computer.last_write == (0x42, 4)
+
+def test_copy_overlap_backward():
+    computer = EightBitComputer()
+    computer.memory[0x40:0x44] = [1, 2, 3, 4]
+    computer.copy_memory(0x40, 0x3E, 4)
+    assert computer.memory[0x3E:0x44] == [1, 2, 3, 4, 3, 4]
+
+def test_copy_clipped_at_end_of_memory():
+    computer = EightBitComputer()
+    computer.memory[0x10:0x14] = [1, 2, 3, 4]
+    computer.copy_memory(0x10, 0xFE, 4)
+    assert computer.memory[0xFE:] == [1, 2]
+    assert computer.last_write == (0xFE, 2)
+
+def test_store_and_push_write_one_byte():
+    computer = run(Assembler().assemble("LOAD 5\nSTORE 0xF\nHALT"))
+    assert computer.memory[0xF] == 5
+    computer = EightBitComputer()
+    computer.push(0x12)
+    assert computer.last_write == (computer.registers['SP'], 1)
+
+def test_rect_clipped_at_display_edge():
+    computer = run(Assembler().assemble("LOAD 1\nRECT 30, 29, 5, 5\nHALT"))
+    lit = [(x, y) for y in range(32) for x in range(32) if computer.graphics_display[y][x]]
+    assert lit == [(x, y) for y in (29, 30, 31) for x in (30, 31)]
+
+def test_rect_off_display():
+    computer = run(Assembler().assemble("LOAD 1\nRECT 32, 0, 4, 4\nRECT 0, 40, 4, 4\nHALT"))
+    assert not any(any(row) for row in computer.graphics_display)
+
+def test_blit_clipped_at_display_edge():
+    computer = run(Assembler().assemble("BLIT SPRITE, 28, 31\nHALT\nSPRITE: DB 8, 2, 0xA5, 0xFF"))
+    assert computer.graphics_display[31][28:] == [1, 0, 1, 0]
+    assert computer.graphics_display[30][28:] == [0, 0, 0, 0]
+
+def test_blit_clipped_at_end_of_memory():
+    computer = EightBitComputer()
+    computer.memory[0xFC:] = [8, 4, 0xFF, 0x81]
+    computer.blit(0xFC, 0, 0)
+    assert computer.graphics_display[0][:8] == [1] * 8
+    assert computer.graphics_display[1][:8] == [1, 0, 0, 0, 0, 0, 0, 1]
+    assert not any(computer.graphics_display[2])
+
+def test_blit_header_at_last_byte():
+    computer = EightBitComputer()
+    computer.memory[0xFF] = 8
+    computer.blit(0xFF, 0, 0)
+    assert not any(any(row) for row in computer.graphics_display)
+
+def test_db_label_is_byte_address():
+    assembler = Assembler()
+    program = assembler.assemble("LOAD 1\nBLIT SPRITE, 0, 0\nHALT\nSPRITE: DB 8, 1, 0xFF")
+    assert assembler.labels['SPRITE'] == 7
+    assert program == [0x00, 1, 0xFC, 7, 0, 0, 0xF0, 8, 1, 0xFF]
+    assert len(assembler.line_map) == len(program)
+    assert run(program).graphics_display[0][:9] == [1] * 8 + [0]
+
+def test_label_after_macro_counts_expanded_bytes():
+    assembler = Assembler()
+    assembler.assemble("%macro TWICE 0\nDISP\nDISP ; again\n%endmacro\n\nTWICE\nLOAD 1\nDATA: DB 1, 2")
+    assert assembler.labels['DATA'] == 4
+
+def test_label_after_macro_with_labelled_line():
+    assembler = Assembler()
+    program = assembler.assemble("%macro M 0\nL: DISP\nDISP\n%endmacro\n\nM\nX: HALT")
+    assert program == [0xF3, 0xF3, 0xF0]
+    assert assembler.labels['X'] == 2
+
+@pytest.mark.parametrize('line', ["FILL 0x40", "FILL", "COPY 1, 2", "RECT 1, 2, 3", "BLIT 1, 2, 3, 4"])
+def test_block_operand_count(line):
+    with pytest.raises(ValueError):
+        Assembler().assemble(f"{line}\nHALT")
+
+def test_jumps_land_on_their_label():
+    program = Assembler().assemble("LOAD 1\nJNZ SKIP\nLOAD 9\nSKIP:\nJMP END\nLOAD 9\nEND:\nHALT")
+    computer = run(program)
+    assert computer.registers['A'] == 1
+    assert computer.halt_reason == 'halt'
+
+def test_call_and_ret():
+    program = Assembler().assemble("CALL F\nHALT\nF:\nLOAD 4\nSHL\nRET")
+    assert program == [0xD3, 0x00, 0xF0, 0x00, 4, 0x80, 0xE0]
+    computer = run(program)
+    assert computer.registers['A'] == 8
+    assert computer.registers['SP'] == 0xFF
+    assert computer.halt_reason == 'halt'
@@ -0,0 +1,108 @@
+import pytest
+
+from computer import EightBitComputer
+from computer import Assembler
+from tracer import TraceWriter, TraceReader, run_traced, HEADER, MAGIC, NO_WRITE, VERSION
+
+MODES = [(False, False), (True, False), (False, True), (True, True)]
+
+SOURCE = """
+LOAD 7
+FILL 0x40, 5
+STORE 3
+COPY 0x40, 0x80, 4
+LOAD 0
+HALT
+"""
+
+def trace(path, source=SOURCE, image=None, **options):
+    computer = EightBitComputer()
+    computer.debug = False
+    program = image if image is not None else Assembler().assemble(source)
+    computer.memory[:len(program)] = program
+    with TraceWriter(path, **options) as writer:
+        cycles = run_traced(computer, writer)
+    return computer, cycles
+
+def countdown(length):
+    # LOAD length, then SUB 0xF / JNZ back to the SUB until A reaches zero
+    return [0x00, length, 0x3F, 0xC0, 0xFE, 0xF0] + [0] * 9 + [1]
+
+@pytest.mark.parametrize('delta, compress', MODES)
+def test_round_trip(tmp_path, delta, compress):
+    path = tmp_path / 'trace.bin'
+    computer, cycles = trace(path, delta=delta, compress=compress, block_records=2)
+    with TraceReader(path) as reader:
+        records = list(reader)
+        assert len(reader) == cycles == 6
+        assert [r.cycle for r in records] == list(range(6))
+        assert [r.pc for r in records] == [0, 2, 5, 6, 10, 12]
+        assert [r.instruction for r in records] == [0x00, 0xF9, 0x13, 0xFA, 0x00, 0xF0]
+        assert records[0].a == 7 and records[4].a == 0
+        assert records[4].flags == 1  # Z
+        assert records[0].sp == 0xFF
+        writes = [(r.write_addr, r.write_len, r.write_value) for r in records]
+        assert writes == [(NO_WRITE, 0, 0), (0x40, 5, 7), (3, 1, 7), (0x80, 4, 7), (NO_WRITE, 0, 0), (NO_WRITE, 0, 0)]
+        assert [reader[i] for i in range(len(reader))] == records
+
+@pytest.mark.parametrize('delta, compress', MODES)
+def test_long_trace_across_blocks(tmp_path, delta, compress):
+    path = tmp_path / 'trace.bin'
+    computer, cycles = trace(path, image=countdown(200), delta=delta, compress=compress, block_records=64)
+    assert cycles == 1 + 2 * 200 + 1
+    with TraceReader(path) as reader:
+        records = list(reader)
+        assert len(records) == cycles
+        assert [r.cycle for r in records] == list(range(cycles))
+        assert records[-1].instruction == 0xF0
+        assert reader[-1] == records[-1]
+        assert reader[-cycles] == records[0]
+        assert reader[64] == records[64]
+        assert reader.at_cycle(0) == records[0]
+        assert reader.at_cycle(300) == records[300]
+        assert reader.at_cycle(cycles - 1) == records[-1]
+        with pytest.raises(KeyError):
+            reader.at_cycle(cycles)
+        with pytest.raises(IndexError):
+            reader[cycles]
+        with pytest.raises(IndexError):
+            reader[-cycles - 1]
+
+@pytest.mark.parametrize('delta, compress', MODES)
+def test_close_after_partial_iteration(tmp_path, delta, compress):
+    path = tmp_path / 'trace.bin'
+    trace(path, image=countdown(50), delta=delta, compress=compress, block_records=8)
+    reader = TraceReader(path)
+    records = iter(reader)
+    next(records)
+    next(records)
+    reader.close()
+    assert reader.map.closed
+
+def test_header(tmp_path):
+    path = tmp_path / 'trace.bin'
+    trace(path, delta=True, compress=True, block_records=32)
+    magic, version, mode, block_records = HEADER.unpack_from(path.read_bytes())
+    assert (magic, version, mode, block_records) == (MAGIC, VERSION, 3, 32)
+    assert VERSION == 2
+
+def test_rejects_other_versions(tmp_path):
+    path = tmp_path / 'trace.bin'
+    path.write_bytes(HEADER.pack(MAGIC, 1, 0, 4096))
+    with pytest.raises(ValueError):
+        TraceReader(path)
+
+def test_delta_is_smaller(tmp_path):
+    raw, delta = tmp_path / 'raw.bin', tmp_path / 'delta.bin'
+    trace(raw, image=countdown(200))
+    trace(delta, image=countdown(200), delta=True)
+    assert delta.stat().st_size < raw.stat().st_size
+
+def test_operand_past_end_of_memory(tmp_path):
+    path = tmp_path / 'trace.bin'
+    image = [0xA0, 0xFE] + [0] * 253 + [0x00]  # JMP to the LOAD in the last byte
+    computer, cycles = trace(path, image=image)
+    assert computer.halted
+    assert computer.halt_reason == 'operand_out_of_range'
+    with TraceReader(path) as reader:
+        assert len(reader) == cycles == 1
@@ -0,0 +1,72 @@
+import random
+
+from computer import EightBitComputer
+from verifier import compare, check_cases, minimize, random_program
+
+class BytearrayEngine(EightBitComputer):
+    # Same semantics, but memory and displays in other containers
+    def __init__(self):
+        super().__init__()
+        self.memory = bytearray(self.memory_size)
+        self.graphics_display = [bytearray(32) for _ in range(32)]
+
+class WrongAdd(EightBitComputer):
+    # ADD adds one too many
+    def execute(self, instruction):
+        if instruction >> 4 == 0x2:
+            self.last_instruction = instruction
+            self.registers['A'] += self.memory[instruction & 0x0F] + 1
+            self.update_flags(self.registers['A'])
+            return
+        super().execute(instruction)
+
+class BatchOnly(EightBitComputer):
+    # Only goes wrong when run more than one instruction at a time
+    def run_steps(self, count):
+        executed = 0
+        while executed < count and not self.halted and not self.waiting_for_input():
+            self.execute(self.fetch())
+            executed += 1
+        if count > 1:
+            self.memory[0x0F] ^= 1
+        return executed
+
+PROGRAM = [0x00, 5, 0x2E, 0x2E, 0xF0] + [0] * 9 + [3]  # LOAD 5, ADD 0xE twice, HALT
+
+def test_identical_engine_with_other_containers():
+    assert compare(BytearrayEngine, PROGRAM, '', 100) is None
+    rnd = random.Random(1)
+    for _ in range(200):
+        image, text = random_program(rnd)
+        assert compare(BytearrayEngine, image, text, 500, 16) is None
+
+def test_wrong_engine_is_caught_at_the_exact_step():
+    divergence = compare(WrongAdd, PROGRAM, '', 100, 64)
+    assert divergence == {'step': 1, 'steps': 1, 'pc': 2, 'field': 'register A',
+                          'reference': '8', 'candidate': '9'}
+
+def test_wrong_engine_with_other_containers():
+    class WrongBytearray(BytearrayEngine, WrongAdd):
+        pass
+    divergence = compare(WrongBytearray, PROGRAM, '', 100, 64)
+    assert divergence['field'] == 'register A'
+
+def test_minimize_keeps_the_failure():
+    image, text = minimize(WrongAdd, PROGRAM, 'abc', 100)
+    assert text == ''
+    assert compare(WrongAdd, image, text, 100)
+    assert image.count(0x2E) == 1
+
+def test_batch_only_divergence_reports_the_checkpoint():
+    divergence = compare(BatchOnly, PROGRAM, '', 100, 4)
+    assert divergence['step'] == 0
+    assert divergence['steps'] == 4
+    assert divergence['field'] == 'memory[0F]'
+    assert compare(BatchOnly, PROGRAM, '', 100, 1) is None
+
+def test_check_cases():
+    cases = [('same', PROGRAM, '')]
+    assert check_cases('test_verifier:BytearrayEngine', cases, 100, 8) == []
+    failures = check_cases('test_verifier:WrongAdd', cases, 100, 8)
+    assert [(f['case'], f['field']) for f in failures] == [('same', 'register A')]
+    assert compare(WrongAdd, failures[0]['image'], failures[0]['input'], 100)
@@ -0,0 +1,295 @@
+import argparse
+import bisect
+import mmap
+import struct
+import zlib
+from collections import namedtuple
+
+from computer import EightBitComputer
+from computer import Assembler
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for TraceReader.arrays()
+    np = None
+
+MAGIC = b'8BTR'
+VERSION = 2
+DELTA = 0x01  # Records are delta/varint encoded in blocks
+COMPRESS = 0x02  # Blocks are zlib compressed
+
+HEADER = struct.Struct('<4sBBI')  # magic, version, mode, records per block
+BLOCK_HEADER = struct.Struct('<IIQ')  # payload length, record count, first cycle
+# cycle, PC, instruction, A, flags (Z | C << 1 | N << 2), SP, first address written (NO_WRITE if none),
+# bytes written (FILL and COPY write a range) and the value of the first byte
+RECORD = struct.Struct('<QHBBBBHBB')
+NO_WRITE = 0xFFFF
+
+TraceRecord = namedtuple('TraceRecord', 'cycle pc instruction a flags sp write_addr write_len write_value')
+
+def pack_flags(flags):
+    return flags['Z'] | (flags['C'] << 1) | (flags['N'] << 2)
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def zigzag(value):
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+def unzigzag(value):
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+def encode_block(records):
+    # Cycle and PC as varint deltas from the previous record, a varint
+    # write address (0 for no write) and the remaining fields as raw bytes
+    out = bytearray()
+    prev_cycle = records[0].cycle
+    prev_pc = 0
+    for r in records:
+        write_varint(out, r.cycle - prev_cycle)
+        write_varint(out, zigzag(r.pc - prev_pc))
+        out += bytes((r.instruction, r.a, r.flags, r.sp))
+        if r.write_addr == NO_WRITE:
+            out.append(0)
+        else:
+            write_varint(out, r.write_addr + 1)
+            out += bytes((r.write_len, r.write_value))
+        prev_cycle = r.cycle
+        prev_pc = r.pc
+    return bytes(out)
+
+def decode_block(data, count, first_cycle):
+    records = []
+    pos = 0
+    cycle = first_cycle
+    pc = 0
+    for _ in range(count):
+        delta, pos = read_varint(data, pos)
+        cycle += delta
+        delta, pos = read_varint(data, pos)
+        pc += unzigzag(delta)
+        instruction, a, flags, sp = data[pos:pos + 4]
+        pos += 4
+        addr, pos = read_varint(data, pos)
+        if addr:
+            records.append(TraceRecord(cycle, pc, instruction, a, flags, sp, addr - 1, data[pos], data[pos + 1]))
+            pos += 2
+        else:
+            records.append(TraceRecord(cycle, pc, instruction, a, flags, sp, NO_WRITE, 0, 0))
+    return records
+
+class TraceWriter:
+    def __init__(self, path, delta=False, compress=False, block_records=4096, buffer_size=1 << 20):
+        self.mode = (DELTA if delta else 0) | (COMPRESS if compress else 0)
+        self.block_records = block_records
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.mode, block_records))
+        self.block = []
+        self.count = 0
+
+    def record(self, cycle, pc, computer):
+        write = computer.last_write
+        fields = (cycle, pc, computer.last_instruction, computer.registers['A'], pack_flags(computer.flags),
+                  computer.registers['SP'], write[0] if write else NO_WRITE, write[1] if write else 0,
+                  computer.memory[write[0]] if write else 0)
+        self.count += 1
+        if not self.mode:
+            self.file.write(RECORD.pack(*fields))
+            return
+        self.block.append(TraceRecord(*fields))
+        if len(self.block) >= self.block_records:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self.block:
+            return
+        if self.mode & DELTA:
+            payload = encode_block(self.block)
+        else:
+            payload = b''.join(RECORD.pack(*r) for r in self.block)
+        if self.mode & COMPRESS:
+            payload = zlib.compress(payload)
+        self.file.write(BLOCK_HEADER.pack(len(payload), len(self.block), self.block[0].cycle))
+        self.file.write(payload)
+        self.block = []
+
+    def close(self):
+        self.flush_block()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def run_traced(computer, writer, max_instructions=None):
+    # Like EightBitComputer.run, but records every executed instruction
+    cycle = 0
+    while not computer.halted and (max_instructions is None or cycle < max_instructions):
+        if computer.waiting_for_input():
+            break
+        pc = computer.registers['PC']
+        try:
+            computer.execute(computer.fetch())
+        except IndexError:  # Operand read past the end of memory, as in the server and fuzzer
+            computer.halted = True
+            computer.halt_reason = 'operand_out_of_range'
+            break
+        writer.record(cycle, pc, computer)
+        cycle += 1
+    return cycle
+
+class TraceReader:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.mode, self.block_records = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} trace file")
+        self.blocks = []  # (offset of payload, payload length, record count, first cycle)
+        self.block_starts = []  # Index of the first record of each block
+        self.cached_block = (None, None)
+        if self.mode:
+            self.index_blocks()
+        else:
+            self.count = (len(self.map) - HEADER.size) // RECORD.size
+
+    def index_blocks(self):
+        offset = HEADER.size
+        self.count = 0
+        while offset + BLOCK_HEADER.size <= len(self.map):
+            length, count, first_cycle = BLOCK_HEADER.unpack_from(self.map, offset)
+            offset += BLOCK_HEADER.size
+            if offset + length > len(self.map):
+                break  # Truncated block from an interrupted writer
+            self.blocks.append((offset, length, count, first_cycle))
+            self.block_starts.append(self.count)
+            self.count += count
+            offset += length
+        self.block_cycles = [b[3] for b in self.blocks]
+
+    def block(self, n):
+        if self.cached_block[0] == n:
+            return self.cached_block[1]
+        offset, length, count, first_cycle = self.blocks[n]
+        payload = self.map[offset:offset + length]
+        if self.mode & COMPRESS:
+            payload = zlib.decompress(payload)
+        if self.mode & DELTA:
+            records = decode_block(payload, count, first_cycle)
+        else:
+            records = [TraceRecord(*r) for r in RECORD.iter_unpack(payload)]
+        self.cached_block = (n, records)
+        return records
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("trace record index out of range")
+        if not self.mode:
+            return TraceRecord(*RECORD.unpack_from(self.map, HEADER.size + i * RECORD.size))
+        n = bisect.bisect_right(self.block_starts, i) - 1
+        return self.block(n)[i - self.block_starts[n]]
+
+    def __iter__(self):
+        if not self.mode:
+            # Copy one block's worth of records at a time rather than the whole
+            # mapping, and hold no buffer export across a yield so close() works
+            # on a half-consumed iterator
+            step = max(self.block_records, 1)
+            for start in range(0, self.count, step):
+                end = min(start + step, self.count)
+                chunk = self.map[HEADER.size + start * RECORD.size:HEADER.size + end * RECORD.size]
+                for fields in RECORD.iter_unpack(chunk):
+                    yield TraceRecord(*fields)
+        else:
+            for n in range(len(self.blocks)):
+                yield from self.block(n)
+
+    def at_cycle(self, cycle):
+        # Records are written in cycle order, so binary search
+        if self.mode:
+            n = bisect.bisect_right(self.block_cycles, cycle) - 1
+            if n < 0:
+                raise KeyError(cycle)
+            records = self.block(n)
+            i = bisect.bisect_left([r.cycle for r in records], cycle)
+            if i < len(records) and records[i].cycle == cycle:
+                return records[i]
+            raise KeyError(cycle)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid].cycle < cycle:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self[lo].cycle == cycle:
+            return self[lo]
+        raise KeyError(cycle)
+
+    def arrays(self):
+        # Column views as NumPy arrays; zero-copy over the mapped file for uncompressed traces
+        if np is None:
+            raise ImportError("TraceReader.arrays() requires NumPy")
+        dtype = np.dtype([('cycle', '<u8'), ('pc', '<u2'), ('instruction', 'u1'), ('a', 'u1'),
+                          ('flags', 'u1'), ('sp', 'u1'), ('write_addr', '<u2'), ('write_len', 'u1'),
+                          ('write_value', 'u1')])
+        if not self.mode:
+            table = np.frombuffer(self.map, dtype=dtype, count=self.count, offset=HEADER.size)
+        else:
+            table = np.fromiter((tuple(r) for n in range(len(self.blocks)) for r in self.block(n)),
+                                dtype=dtype, count=self.count)
+        return {name: table[name] for name in dtype.names}
+
+    def close(self):
+        self.cached_block = (None, None)
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a binary execution trace of an assembly program")
+    parser.add_argument('source', help="Assembly source file")
+    parser.add_argument('trace', help="Trace file to write")
+    parser.add_argument('--max', type=int, default=1000000, help="Instruction budget")
+    parser.add_argument('--input', default='', help="Input queued for IN")
+    parser.add_argument('--delta', action='store_true', help="Delta/varint encode records")
+    parser.add_argument('--compress', action='store_true', help="zlib compress record blocks")
+    args = parser.parse_args()
+
+    with open(args.source) as f:
+        program = Assembler().assemble(f.read())
+    computer = EightBitComputer()
+    computer.debug = False
+    computer.load_program(program)
+    computer.io_buffer = args.input
+    with TraceWriter(args.trace, delta=args.delta, compress=args.compress) as writer:
+        cycles = run_traced(computer, writer, args.max)
+    print(f"Recorded {cycles} instructions to {args.trace}")
+    if computer.halted:
+        print(f"Halted: {computer.halt_reason}")
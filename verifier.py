@@ -0,0 +1,209 @@
+import argparse
+import glob
+import importlib
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from computer import EightBitComputer
+from computer import Assembler
+from analyzer import BLOCK_SIZES
+from fuzzer import quiet_worker
+
+NOP = 0xFF  # Unassigned 0xF opcode; executes as a no-op, used to blank out bytes when minimizing
+REGISTERS = ('A', 'B', 'SP', 'PC')
+FLAGS = ('Z', 'C', 'N')
+DISPLAY = ('cursor_x', 'cursor_y', 'scroll_offset', 'display_mode')
+
+# A candidate engine is a class built like EightBitComputer with the same
+# state attributes. It either overrides fetch/execute, or provides
+# run_steps(count), which runs up to count instructions, stops early when
+# halted or at an IN with no queued input, and returns how many it ran.
+
+def load_engine(spec):
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)
+
+def new_machine(engine, image, text):
+    machine = engine()
+    machine.debug = False
+    machine.memory[:len(image)] = image
+    machine.io_buffer = text
+    return machine
+
+def reference_steps(machine, count):
+    executed = 0
+    while executed < count and not machine.halted and not machine.waiting_for_input():
+        machine.execute(machine.fetch())
+        executed += 1
+    return executed
+
+def steps(machine, count, reference):
+    # Returns (instructions run, name of the exception that stopped the engine or None)
+    try:
+        if reference or not hasattr(machine, 'run_steps'):
+            return reference_steps(machine, count), None
+        return machine.run_steps(count), None
+    except Exception as e:
+        return None, type(e).__name__
+
+def values(cells):
+    # A plain list of ints, so candidates may keep state in bytearrays or arrays
+    return [int(v) for v in cells]
+
+def difference(ref, cand):
+    # First differing piece of state as (field, reference value, candidate value), or None
+    ref_memory, cand_memory = values(ref.memory), values(cand.memory)
+    if len(ref_memory) != len(cand_memory):
+        return "memory size", len(ref_memory), len(cand_memory)
+    if ref_memory != cand_memory:
+        addr = next(i for i, (r, c) in enumerate(zip(ref_memory, cand_memory)) if r != c)
+        return f"memory[{addr:02X}]", ref_memory[addr], cand_memory[addr]
+    for reg in REGISTERS:
+        if ref.registers[reg] != cand.registers[reg]:
+            return f"register {reg}", ref.registers[reg], cand.registers[reg]
+    for flag in FLAGS:
+        if ref.flags[flag] != cand.flags[flag]:
+            return f"flag {flag}", ref.flags[flag], cand.flags[flag]
+    for name in ('text_display', 'graphics_display'):
+        ref_rows = [values(row) for row in getattr(ref, name)]
+        cand_rows = [values(row) for row in getattr(cand, name)]
+        if [len(row) for row in ref_rows] != [len(row) for row in cand_rows]:
+            return f"{name} size", [len(row) for row in ref_rows], [len(row) for row in cand_rows]
+        if ref_rows != cand_rows:
+            y, x = next((y, x) for y, (r, c) in enumerate(zip(ref_rows, cand_rows)) for x in range(len(r)) if r[x] != c[x])
+            return f"{name}[{y}][{x}]", ref_rows[y][x], cand_rows[y][x]
+    for name in DISPLAY + ('halted', 'halt_reason', 'io_buffer'):
+        if getattr(ref, name) != getattr(cand, name):
+            return name, getattr(ref, name), getattr(cand, name)
+    return None
+
+def compare(engine, image, text, budget, checkpoint=1):
+    # Runs the reference and the candidate side by side, comparing state every
+    # checkpoint instructions. Returns the first divergence as a dict, or None.
+    # 'steps' is how many instructions the divergence may lie in: 1 once the
+    # exact step is found, more if a step-by-step replay no longer diverges.
+    ref = new_machine(EightBitComputer, image, text)
+    cand = new_machine(engine, image, text)
+    executed = 0
+    while executed < budget:
+        count = min(checkpoint, budget - executed)
+        pc = ref.registers['PC']
+        ref_done, ref_error = steps(ref, count, reference=True)
+        cand_done, cand_error = steps(cand, count, reference=False)
+        diff = None
+        if ref_error or cand_error:
+            if ref_error != cand_error:
+                diff = ('exception', ref_error, cand_error)
+        elif ref_done != cand_done:
+            diff = ('instructions run', ref_done, cand_done)
+        else:
+            diff = difference(ref, cand)
+        if diff:
+            if checkpoint > 1:  # Replay one instruction at a time to find the exact step
+                exact = compare(engine, image, text, executed + count, 1)
+                if exact:
+                    return exact
+            return {'step': executed, 'steps': count, 'pc': pc, 'field': diff[0],
+                    'reference': repr(diff[1]), 'candidate': repr(diff[2])}
+        if ref_error or ref_done < count:
+            return None  # Both halted, faulted or ran out of input the same way
+        executed += count
+    return None
+
+def minimize(engine, image, text, budget, checkpoint=1):
+    # Blanks out chunks of the program with NOPs and drops input characters
+    # for as long as the engines still disagree
+    image = list(image)
+    chunk = max(len(image) // 2, 1)
+    while chunk >= 1:
+        start = 0
+        while start < len(image):
+            trial = image[:start] + [NOP] * len(image[start:start + chunk]) + image[start + chunk:]
+            if trial != image and compare(engine, trial, text, budget, checkpoint):
+                image = trial
+            start += chunk
+        chunk //= 2
+    while image and image[-1] == NOP and compare(engine, image[:-1], text, budget, checkpoint):
+        image.pop()
+    i = 0
+    while i < len(text):
+        trial = text[:i] + text[i + 1:]
+        if compare(engine, image, trial, budget, checkpoint):
+            text = trial
+        else:
+            i += 1
+    return image, text
+
+def random_program(rnd):
+    # Random bytes biased toward valid instructions, ending in HALT
+    length = rnd.randint(4, 64)
+    program = []
+    while len(program) < length:
+        op = rnd.randrange(16)
+        if op in (0x0, 0xA, 0xB, 0xC, 0xD):
+            program += [op << 4 | rnd.randrange(16), rnd.randrange(256)]
+        elif op == 0xF:
+            byte = 0xF0 | rnd.randrange(0xD)  # HALT through BLIT
+            program.append(byte)
+            program += [rnd.randrange(256) for _ in range(BLOCK_SIZES.get(byte, 1) - 1)]
+        else:
+            program.append(op << 4 | rnd.randrange(16))
+    program.append(0xF0)
+    text = ''.join(chr(rnd.randrange(32, 127)) for _ in range(rnd.randint(0, 8)))
+    return program[:256], text
+
+def check_cases(engine_spec, cases, budget, checkpoint):
+    # Runs in a worker: returns minimized reproducers for diverging cases
+    engine = load_engine(engine_spec)
+    failures = []
+    for name, image, text in cases:
+        if compare(engine, image, text, budget, checkpoint):
+            image, text = minimize(engine, image, text, budget, checkpoint)
+            divergence = compare(engine, image, text, budget, checkpoint)  # Report where the reproducer diverges
+            divergence.update(case=name, image=image, input=text)
+            failures.append(divergence)
+    return failures
+
+def verify(engine_spec, cases, budget=5000, checkpoint=64, workers=None, chunk_size=50):
+    chunks = [cases[i:i + chunk_size] for i in range(0, len(cases), chunk_size)]
+    failures = []
+    with ProcessPoolExecutor(workers, initializer=quiet_worker) as pool:
+        futures = [pool.submit(check_cases, engine_spec, chunk, budget, checkpoint) for chunk in chunks]
+        for future in futures:
+            failures.extend(future.result())
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check an alternative execution engine against EightBitComputer")
+    parser.add_argument('engine', help="Candidate engine class as module:Class")
+    parser.add_argument('--cases', type=int, default=10000, help="Random programs to generate")
+    parser.add_argument('--corpus', help="Directory of .asm programs to check as well")
+    parser.add_argument('--budget', type=int, default=5000, help="Instruction budget per program")
+    parser.add_argument('--checkpoint', type=int, default=64, help="Instructions between state comparisons")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='divergences', help="Directory to save reproducers to")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    cases = [(f"random-{i}", *random_program(rnd)) for i in range(args.cases)]
+    if args.corpus:
+        for path in sorted(glob.glob(os.path.join(args.corpus, '*.asm'))):
+            with open(path) as f:
+                program = [b & 0xFF for b in Assembler().assemble(f.read())[:256]]
+            cases.append((os.path.basename(path), program, ''))
+    failures = verify(args.engine, cases, args.budget, args.checkpoint, args.workers)
+    for failure in failures:
+        where = f"step {failure['step']}"
+        if failure['steps'] > 1:  # Only shows up when run in batches of instructions
+            where = f"steps {failure['step']}-{failure['step'] + failure['steps'] - 1}"
+        print(f"{failure['case']}: {failure['field']} differs at {where}, PC {failure['pc']:02X} "
+              f"(reference {failure['reference']}, candidate {failure['candidate']})")
+    if failures:
+        os.makedirs(args.out, exist_ok=True)
+        for failure in failures:
+            with open(os.path.join(args.out, f"{failure['case']}.json"), 'w') as f:
+                json.dump(failure, f)
+    print(f"{len(cases)} programs checked, {len(failures)} divergences")